@@ -1,19 +1,33 @@
 import logging
+import os
+import re
+import shutil
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from importlib import import_module
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import bgym
-from browsergym.experiments.loop import ExpArgs, yield_all_exp_results
+if TYPE_CHECKING:
+    import bgym
+    from browsergym.experiments.loop import ExpArgs
 
-from agentlab.experiments.exp_utils import run_exp
+# number of threads used for filesystem-bound operations on experiment directories
+_N_IO_WORKERS = 32
+
+PARALLEL_BACKENDS = ("joblib", "ray", "sequential")
 
 
 def run_experiments(
     n_jobs,
-    exp_args_list: list[ExpArgs],
+    exp_args_list: list["ExpArgs"],
     study_dir,
     parallel_backend="ray",
     avg_step_timeout=60,
+    memory_per_job_gb=None,
+    local_scratch=None,
 ):
     """Run a list of ExpArgs in parallel.
 
@@ -22,7 +36,7 @@ def run_experiments(
 
     Args:
         n_jobs: int
-            Number of parallel jobs.
+            Number of parallel jobs. Use -1 (or None) to use all cores but one.
         exp_args_list: list[ExpArgs]
             List of ExpArgs objects.
         study_dir: Path
@@ -32,15 +46,32 @@ def run_experiments(
             The only backend that supports webarena graph dependencies correctly is ray or sequential.
         avg_step_timeout: int
             Will raise a TimeoutError if the episode is not finished after env_args.max_steps * avg_step_timeout seconds.
+        memory_per_job_gb: float
+            Expected memory usage of one job. If set, n_jobs is capped to fit in the available
+            memory (requires psutil).
+        local_scratch: Path
+            If set, experiments are still prepared in study_dir, but write their steps and results
+            in local_scratch/<study_dir name> while running. These are moved to study_dir once
+            the jobs are finished (even on exception or ctrl+c). Use a local disk when study_dir
+            is on a shared filesystem that is slow with many small writes.
 
     Raises:
         ValueError: If the parallel_backend is not recognized.
     """
 
+    # fail before preparing agents and experiment directories
+    if parallel_backend not in PARALLEL_BACKENDS:
+        raise ValueError(f"Unknown parallel_backend: {parallel_backend}")
+
     if len(exp_args_list) == 0:
         logging.warning("No experiments to run.")
         return
 
+    # imported here so that e.g. import_object doesn't pull browsergym
+    from agentlab.experiments.exp_utils import run_exp
+
+    n_jobs = _resolve_n_jobs(n_jobs, memory_per_job_gb=memory_per_job_gb)
+
     study_dir = Path(study_dir)
     study_dir.mkdir(parents=True, exist_ok=True)
 
@@ -48,27 +79,40 @@ def run_experiments(
     #     logging.warning("Only 1 job, switching to sequential backend.")
     #     parallel_backend = "sequential"
 
-    logging.info(f"Saving experiments to {study_dir}")
-    for exp_args in exp_args_list:
-        exp_args.agent_args.prepare()
-        exp_args.prepare(exp_root=study_dir)
+    logging.info("Saving experiments to %s", study_dir)
+    # experiments of the same agent usually share the same agent_args object, each distinct
+    # agent_args is prepared once and closed once
+    agent_args_by_id = {id(exp_args.agent_args): exp_args.agent_args for exp_args in exp_args_list}
+    agent_args_list = list(agent_args_by_id.values())
+    for agent_args in agent_args_list:
+        agent_args.prepare()  # can start servers, keep it sequential
+    _prepare_exp_dirs(exp_args_list, study_dir, n_workers=min(_N_IO_WORKERS, 4 * n_jobs))
+    scratch_root = None if local_scratch is None else Path(local_scratch) / study_dir.name
     try:
+        if scratch_root is not None:
+            logging.info("Experiments will run in %s and be moved once finished.", scratch_root)
+            _redirect_exp_dirs(exp_args_list, study_dir, scratch_root)
+
         if parallel_backend == "joblib":
             from joblib import Parallel, delayed
 
             # split sequential (should be no longer needed with dependencies)
-            sequential_exp_args, exp_args_list = _split_sequential_exp(exp_args_list)
+            sequential_exp_args, parallel_exp_args = _split_sequential_exp(exp_args_list)
 
             logging.info(
-                f"Running {len(sequential_exp_args)} in sequential first. The remaining {len(exp_args_list)} will be run in parallel."
+                "Running %d in sequential first. The remaining %d will be run in parallel.",
+                len(sequential_exp_args),
+                len(parallel_exp_args),
             )
             for exp_args in sequential_exp_args:
                 run_exp(exp_args, avg_step_timeout=avg_step_timeout)
 
-            Parallel(n_jobs=n_jobs, prefer="processes")(
-                delayed(run_exp)(exp_args, avg_step_timeout=avg_step_timeout)
-                for exp_args in exp_args_list
-            )
+            run_exp_delayed = delayed(run_exp)  # wrap the function once, not once per task
+            tasks = [
+                run_exp_delayed(exp_args, avg_step_timeout=avg_step_timeout)
+                for exp_args in parallel_exp_args
+            ]
+            Parallel(n_jobs=n_jobs, prefer="processes")(tasks)
 
         # dask will be deprecated, as there was issues. use ray instead
         # elif parallel_backend == "dask":
@@ -96,8 +140,9 @@ def run_experiments(
         # will close servers even if there is an exception or ctrl+c
         # servers won't be closed if the script is killed with kill -9 or segfaults.
         logging.info("All jobs are finished. Calling agent_args.close() on all agents...")
-        for exp_args in exp_args_list:
-            exp_args.agent_args.close()
+        _close_agents(agent_args_list)
+        if scratch_root is not None:
+            _move_exp_dirs(exp_args_list, scratch_root, study_dir)
         logging.info("Experiment finished.")
 
 
@@ -122,6 +167,8 @@ def find_incomplete(study_dir: str | Path, include_errors=True):
     Raises:
         ValueError: If the study_dir does not exist.
     """
+    from browsergym.experiments.loop import get_exp_result
+
     study_dir = Path(study_dir)
 
     if not study_dir.exists():
@@ -129,36 +176,194 @@ def find_incomplete(study_dir: str | Path, include_errors=True):
             f"You asked to relaunch an existing experiment but {study_dir} does not exist."
         )
 
-    exp_result_list = list(yield_all_exp_results(study_dir, progress_fn=None))
-    exp_args_list = [_hide_completed(exp_result, include_errors) for exp_result in exp_result_list]
+    exp_result_list = [get_exp_result(exp_dir) for exp_dir in _iter_exp_dirs(study_dir)]
+    # loading summary_info and exp_args is I/O bound, overlap the reads of each experiment
+    hidden_status = ("done",) if include_errors else ("done", "error")
+    hide_completed = partial(_hide_completed, hidden_status=hidden_status)
+    with ThreadPoolExecutor(max_workers=_N_IO_WORKERS) as executor:
+        exp_args_list = list(executor.map(hide_completed, exp_result_list))
     # sort according to exp_args.order
     exp_args_list.sort(key=lambda exp_args: exp_args.order if exp_args.order is not None else 0)
 
     job_count = non_dummy_count(exp_args_list)
 
     if job_count == 0:
-        logging.info(f"No incomplete experiments found in {study_dir}.")
+        logging.info("No incomplete experiments found in %s.", study_dir)
         return exp_args_list
     else:
-        logging.info(f"Found {job_count} incomplete experiments in {study_dir}.")
-
-    message = f"Make sure the processes that were running are all stopped. Otherwise, "
-    f"there will be concurrent writing in the same directories.\n"
+        logging.info("Found %d incomplete experiments in %s.", job_count, study_dir)
 
-    logging.info(message)
+    logging.info(
+        "Make sure the processes that were running are all stopped. Otherwise, "
+        "there will be concurrent writing in the same directories.\n"
+    )
 
     return exp_args_list
 
 
-def non_dummy_count(exp_args_list: list[ExpArgs]) -> int:
-    return sum([not exp_args.is_dummy for exp_args in exp_args_list])
+def _resolve_n_jobs(n_jobs: int | None, memory_per_job_gb: float | None = None) -> int:
+    """Turn n_jobs into a positive number of jobs that the machine can sustain.
+
+    n_jobs=None or n_jobs < 1 uses all cores but one, keeping one for the main process. If
+    memory_per_job_gb is given, n_jobs is also capped by the available memory.
+    """
+    if memory_per_job_gb is not None and memory_per_job_gb <= 0:
+        raise ValueError(f"memory_per_job_gb must be positive, got {memory_per_job_gb}.")
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = max(1, (os.cpu_count() or 1) - 1)
+        logging.info("Using n_jobs=%d based on the number of cores.", n_jobs)
+
+    if memory_per_job_gb is not None:
+        import psutil
+
+        max_jobs_by_mem = int(psutil.virtual_memory().available / (memory_per_job_gb * 2**30))
+        if max_jobs_by_mem < n_jobs:
+            n_jobs = max(1, max_jobs_by_mem)
+            logging.warning(
+                "Reducing n_jobs to %d to fit in the available memory (%.1f GB per job).",
+                n_jobs,
+                memory_per_job_gb,
+            )
+
+    return n_jobs
+
+
+def _close_agents(agent_args_list: list):
+    """Close agent_args concurrently, closing is usually a blocking network call.
+
+    Errors are logged so that one failing agent doesn't prevent closing the others.
+    """
+    if len(agent_args_list) == 0:
+        return
+
+    def close(agent_args):
+        try:
+            agent_args.close()
+        except Exception:
+            logging.exception("Error while closing %s.", type(agent_args).__name__)
+
+    with ThreadPoolExecutor(max_workers=min(16, len(agent_args_list))) as executor:
+        list(executor.map(close, agent_args_list))
+
+
+def _prepare_exp_dirs(exp_args_list: list["ExpArgs"], exp_root: Path, n_workers: int):
+    """Call exp_args.prepare(exp_root) on all experiments using a thread pool.
+
+    exp_args.prepare picks a unique exp_dir named after exp_name (plus a _<i> tag) by checking
+    which names already exist, which is not safe for experiments whose names can collide.
+    Experiments are thus grouped by their sanitized name prefix, and each group is prepared
+    sequentially in one thread.
+    """
+    # the seed is sampled by prepare when missing, keep these in order in the main thread
+    pending = []
+    for exp_args in exp_args_list:
+        if exp_args.env_args.task_seed is None:
+            exp_args.prepare(exp_root=exp_root)
+        else:
+            pending.append(exp_args)
+
+    groups = defaultdict(list)
+    for exp_args in pending:
+        groups[_exp_name_key(exp_args)].append(exp_args)
+
+    def prepare_group(group):
+        for exp_args in group:
+            exp_args.prepare(exp_root=exp_root)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        list(executor.map(prepare_group, groups.values()))
+
+
+def _exp_name_key(exp_args: "ExpArgs") -> str:
+    """Name prefix shared by all the exp_dirs that ExpArgs._make_dir could give to exp_args."""
+    if exp_args.exp_name is not None:
+        name = exp_args.exp_name
+    else:
+        # default exp_name is f"{agent_name}_on_{task_name}_{task_seed}"
+        name = f"{exp_args.agent_args.agent_name}_on_{exp_args.env_args.task_name}"
+    # same sanitization as ExpArgs._make_dir
+    return re.sub(r"[\/:*?<>|]", "_", name)
+
+
+def _redirect_exp_dirs(exp_args_list: list["ExpArgs"], study_dir: Path, scratch_root: Path):
+    """Point the experiments prepared in study_dir to a directory of the same name in scratch_root.
+
+    Their exp_args.pkl stays in study_dir, so that find_incomplete still finds them if the process
+    is killed before _move_exp_dirs is called.
+    """
+    for exp_args in exp_args_list:
+        # dummy exp_args are already done, they have nothing to write
+        if getattr(exp_args, "is_dummy", False) or Path(exp_args.exp_dir).parent != study_dir:
+            continue
+        exp_args.exp_dir = scratch_root / Path(exp_args.exp_dir).name
+        exp_args.exp_dir.mkdir(parents=True, exist_ok=True)
+
+
+def _move_exp_dirs(exp_args_list: list["ExpArgs"], src_root: Path, dst_root: Path):
+    """Move what the experiments wrote in src_root to their directory of the same name in dst_root.
+
+    Failures are logged per experiment, the files that could not be moved stay in src_root.
+    """
+    to_move = [
+        exp_args
+        for exp_args in exp_args_list
+        if exp_args.exp_dir is not None and Path(exp_args.exp_dir).parent == src_root
+    ]
+
+    def move(exp_args):
+        src_dir = Path(exp_args.exp_dir)
+        dst_dir = dst_root / src_dir.name
+        # this runs in a finally block, log errors to not mask the original exception
+        try:
+            for entry in src_dir.iterdir():
+                shutil.move(entry, dst_dir / entry.name)
+            src_dir.rmdir()
+        except Exception:
+            logging.exception("Could not move %s to %s.", src_dir, dst_dir)
+            return
+        exp_args.exp_dir = dst_dir
+
+    logging.info("Moving %d experiments from %s to %s", len(to_move), src_root, dst_root)
+    with ThreadPoolExecutor(max_workers=_N_IO_WORKERS) as executor:
+        list(executor.map(move, to_move))
+
+    try:
+        src_root.rmdir()  # only if everything was moved
+    except OSError:
+        pass
+
+
+def _iter_exp_dirs(root: str | Path):
+    """Recursively yield the experiment directories (containing exp_args.pkl) under root.
+
+    Same selection as yield_all_exp_results (directories starting with "_" or "." are
+    skipped), but walks with os.scandir to avoid creating a Path and stat-ing every entry.
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        dir_path = stack.pop()
+        is_exp_dir = False
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name == "exp_args.pkl":
+                    is_exp_dir = True
+        if is_exp_dir and not os.path.basename(dir_path).startswith(("_", ".")):
+            yield Path(dir_path)
+
+
+def non_dummy_count(exp_args_list: list["ExpArgs"]) -> int:
+    # exp_args that did not go through find_incomplete don't have is_dummy
+    return sum(not getattr(exp_args, "is_dummy", False) for exp_args in exp_args_list)
 
 
 def noop(*args, **kwargs):
     pass
 
 
-def _hide_completed(exp_result: bgym.ExpResult, include_errors: bool = True):
+def _hide_completed(exp_result: "bgym.ExpResult", hidden_status: tuple[str, ...] = ("done",)):
     """Hide completed experiments from the list.
 
     This little hack, allows an elegant way to keep the task dependencies for e.g. webarena
@@ -167,23 +372,22 @@ def _hide_completed(exp_result: bgym.ExpResult, include_errors: bool = True):
     Args:
         exp_result: bgym.ExpResult
             The experiment result to hide.
-        include_errors: bool
-            If True, include experiments that errored.
+        hidden_status: tuple[str, ...]
+            The status of the experiments to hide. e.g. ("done", "error") to not relaunch
+            experiments that errored.
 
     Returns:
         ExpArgs
             The ExpArgs object hidden if the experiment is completed.
     """
 
-    hide = False
-    if exp_result.status == "done":
-        hide = True
-    if exp_result.status == "error" and (not include_errors):
-        hide = True
+    # status reads summary_info.json each time it is missing, only query it once
+    status = exp_result.status
+    hide = status in hidden_status
 
     exp_args = exp_result.exp_args
     exp_args.is_dummy = hide  # just to keep track
-    exp_args.status = exp_result.status
+    exp_args.status = status
     if hide:
         # make those function do nothing since they are finished.
         exp_args.run = noop
@@ -193,7 +397,9 @@ def _hide_completed(exp_result: bgym.ExpResult, include_errors: bool = True):
 
 
 # TODO remove this function once ray backend is stable
-def _split_sequential_exp(exp_args_list: list[ExpArgs]) -> tuple[list[ExpArgs], list[ExpArgs]]:
+def _split_sequential_exp(
+    exp_args_list: list["ExpArgs"],
+) -> tuple[list["ExpArgs"], list["ExpArgs"]]:
     """split exp_args that are flagged as sequential from those that are not"""
     sequential_exp_args = []
     parallel_exp_args = []
@@ -214,11 +420,14 @@ def _split_path(path: str):
     return module_name, obj_name
 
 
+@lru_cache(maxsize=None)
 def import_object(path: str):
+    """Import an object from its dotted path. Results are cached by path."""
     module_name, obj_name = _split_path(path)
     try:
-        module = import_module(module_name)
-        obj = getattr(module, obj_name)
+        if module_name not in sys.modules:
+            import_module(module_name)
+        obj = getattr(sys.modules[module_name], obj_name)
     except (ImportError, AttributeError) as e:
         raise ImportError(f"Error importing {path}: {e}")
     return obj
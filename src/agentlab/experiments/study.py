@@ -10,6 +10,7 @@ from datetime import datetime
 from pathlib import Path
 
 import bgym
+import numpy as np
 from bgym import Benchmark, EnvArgs, ExpArgs
 from slugify import slugify
 
@@ -17,10 +18,14 @@ from agentlab.agents.agent_args import AgentArgs
 from agentlab.analyze import inspect_results
 from agentlab.experiments import reproducibility_util as repro
 from agentlab.experiments.exp_utils import RESULTS_DIR, add_dependencies
-from agentlab.experiments.launch_exp import find_incomplete, non_dummy_count, run_experiments
+from agentlab.experiments.launch_exp import (
+    PARALLEL_BACKENDS,
+    find_incomplete,
+    non_dummy_count,
+    run_experiments,
+)
 from agentlab.experiments.multi_server import BaseServer, WebArenaInstanceVars
 from multiprocessing import Pool, Manager, Queue
-import random
 
 logger = logging.getLogger(__name__)
 
@@ -158,9 +163,15 @@ class AbstractStudy(ABC):
 
         return result_df, summary_df, error_report
 
-    def shuffle_exps(self):
-        """Shuffle the experiments in the study."""
-        self.exp_args_list = random.sample(self.exp_args_list, len(self.exp_args_list))
+    def shuffle_exps(self, seed=None):
+        """Shuffle the experiments in the study.
+
+        Args:
+            seed: int
+                Seed of the permutation. Use it to get the same order across launches.
+        """
+        idx = np.random.default_rng(seed).permutation(len(self.exp_args_list))
+        self.exp_args_list = [self.exp_args_list[i] for i in idx.tolist()]
 
 
 @dataclass
@@ -212,6 +223,13 @@ class Study(AbstractStudy):
         demo_mode: bool
             If True, the experiments will be run in demo mode, which will record videos, and enable
             visual effects for actions.
+        local_scratch: Path
+            If set, experiments write their steps and results on this (local) directory while they
+            run, and these are moved to the study directory at the end. Useful when the study
+            directory is on a shared filesystem.
+        memory_per_job_gb: float
+            Expected memory usage of one job. If set, n_jobs is capped to fit in the available
+            memory (requires psutil).
     """
 
     agent_args: list[AgentArgs] = None
@@ -226,6 +244,8 @@ class Study(AbstractStudy):
     ignore_dependencies: bool = False
     avg_step_timeout: int = 60
     demo_mode: bool = False
+    local_scratch: Path = None
+    memory_per_job_gb: float = None
 
     def __post_init__(self):
         """Initialize the study. Set the uuid, and generate the exp_args_list."""
@@ -260,13 +280,13 @@ class Study(AbstractStudy):
         """
         self.exp_args_list = find_incomplete(self.dir, include_errors=include_errors)
         n_incomplete = non_dummy_count(self.exp_args_list)
-        n_error = [
+        n_error = sum(
             getattr(exp_args, "status", "incomplete") == "error" for exp_args in self.exp_args_list
-        ].count(True)
+        )
         return n_incomplete, n_error
 
     def load_exp_args_list(self):
-        logger.info(f"Loading experiments from {self.dir}")
+        logger.info("Loading experiments from %s", self.dir)
         self.exp_args_list = list(inspect_results.yield_all_exp_results(savedir_base=self.dir))
 
     def set_reproducibility_info(self, strict_reproducibility=False, comment=None):
@@ -305,6 +325,29 @@ class Study(AbstractStudy):
         relaunch_errors=True,
         exp_root=RESULTS_DIR,
     ):
+        """Run the study and relaunch incomplete or errored experiments up to n_relaunch times.
+
+        Args:
+            n_jobs: int
+                Number of parallel jobs. Use -1 to use all cores but one. If memory_per_job_gb is
+                set, it is also capped by the available memory.
+            parallel_backend: str
+                Parallel backend to use. Either "joblib", "ray" or "sequential".
+            strict_reproducibility: bool
+                If True, all modifications have to be committed before running the experiments.
+                Also, if relaunching a study, it will not be possible if the code has changed.
+            n_relaunch: int
+                Maximum number of trials.
+            relaunch_errors: bool
+                If True, errored experiments are relaunched along with incomplete ones.
+            exp_root: Path
+                Directory where the study directory is created.
+
+        Raises:
+            ValueError: If the parallel_backend is not recognized.
+        """
+        if parallel_backend not in PARALLEL_BACKENDS:
+            raise ValueError(f"Unknown parallel_backend: {parallel_backend}")
 
         self.set_reproducibility_info(
             strict_reproducibility=strict_reproducibility, comment=self.comment
@@ -315,31 +358,34 @@ class Study(AbstractStudy):
         last_error_count = None
 
         for i in range(n_relaunch):
-            logger.info(f"Launching study {self.name} - trial {i + 1} / {n_relaunch}")
+            logger.info("Launching study %s - trial %d / %d", self.name, i + 1, n_relaunch)
             self._run(n_jobs, parallel_backend, strict_reproducibility)
 
             suffix = f"trial_{i + 1}_of_{n_relaunch}"
             _, summary_df, _ = self.get_results(suffix=suffix)
-            logger.info("\n" + str(summary_df))
+            logger.info("\n%s", summary_df)
 
             n_incomplete, n_error = self.find_incomplete(include_errors=relaunch_errors)
 
             if n_error / n_exp > 0.3:
-                logger.warning(f"More than 30% of the experiments errored. Stopping the study.")
+                logger.warning("More than 30% of the experiments errored. Stopping the study.")
                 return
 
             if last_error_count is not None and n_error >= last_error_count:
                 logger.warning(
-                    f"Last trial did not reduce the number of errors. Stopping the study."
+                    "Last trial did not reduce the number of errors. Stopping the study."
                 )
                 return
 
             if n_incomplete == 0:
-                logger.info(f"Study {self.name} finished.")
+                logger.info("Study %s finished.", self.name)
                 return
 
         logger.warning(
-            f"Study {self.name} did not finish after {n_relaunch} trials. There are {n_incomplete} incomplete experiments."
+            "Study %s did not finish after %d trials. There are %d incomplete experiments.",
+            self.name,
+            n_relaunch,
+            n_incomplete,
         )
 
     def _run(self, n_jobs=1, parallel_backend="joblib", strict_reproducibility=False):
@@ -347,9 +393,9 @@ class Study(AbstractStudy):
 
         Args:
             n_jobs: int
-                Number of parallel jobs.
+                Number of parallel jobs. Use -1 to use all cores but one.
             parallel_backend: str
-                Parallel backend to use. Either "joblib", "dask" or "sequential".
+                Parallel backend to use. Either "joblib", "ray" or "sequential".
             strict_reproducibility: bool
                 If True, all modifications have to be committed before running the experiments.
                 Also, if relaunching a study, it will not be possible if the code has changed.
@@ -361,6 +407,10 @@ class Study(AbstractStudy):
         if self.exp_args_list is None:
             raise ValueError("exp_args_list is None. Please set exp_args_list before running.")
 
+        if non_dummy_count(self.exp_args_list) == 0:
+            logger.info("No experiments to run, skipping the preparation of backends.")
+            return
+
         logger.info("Preparing backends...")
         self.benchmark.prepare_backends()
         logger.info("Backends ready.")
@@ -371,6 +421,8 @@ class Study(AbstractStudy):
             self.dir,
             parallel_backend=parallel_backend,
             avg_step_timeout=self.avg_step_timeout,
+            local_scratch=self.local_scratch,
+            memory_per_job_gb=self.memory_per_job_gb,
         )
 
     def append_to_journal(self, strict_reproducibility=True):
@@ -485,8 +537,8 @@ class SequentialStudies(AbstractStudy):
         self.save(exp_root=exp_root)
         self._run(n_jobs, parallel_backend, strict_reproducibility, n_relaunch)
         _, summary_df, _ = self.get_results()
-        logger.info("\n" + str(summary_df))
-        logger.info(f"SequentialStudies {self.name} finished.")
+        logger.info("\n%s", summary_df)
+        logger.info("SequentialStudies %s finished.", self.name)
 
     def _run(self, n_jobs=1, parallel_backend="ray", strict_reproducibility=False, n_relaunch=3):
         for study in self.studies:
@@ -515,7 +567,7 @@ def _init_worker(server_queue: Queue):
     print("initializing server instance with on process", os.getpid())
     print(f"using queue {server_queue}")
     server_instance = server_queue.get()  # type: "WebArenaInstanceVars"
-    logger.warning(f"Initializing server instance {server_instance} from process {os.getpid()}")
+    logger.warning("Initializing server instance %s from process %d", server_instance, os.getpid())
     server_instance.init()
 
 
@@ -668,7 +720,7 @@ def _agents_on_benchmark(
     if not isinstance(agents, (list, tuple)):
         agents = [agents]
 
-    if benchmark.name.startswith("visualwebarena") or benchmark.name.startswith("webarena"):
+    if benchmark.name.startswith(("visualwebarena", "webarena")):
         if len(agents) > 1:
             raise ValueError(
                 f"Only one agent can be run on {benchmark.name} since the instance requires manual reset after each evaluation."
@@ -704,7 +756,8 @@ def _agents_on_benchmark(
         exp_args_list = add_dependencies(exp_args_list, benchmark.dependency_graph_over_tasks())
     else:
         logger.warning(
-            f"Ignoring dependencies for benchmark {benchmark.name}. This could lead to different results."
+            "Ignoring dependencies for benchmark %s. This could lead to different results.",
+            benchmark.name,
         )
 
     return exp_args_list
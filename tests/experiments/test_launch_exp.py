@@ -1,5 +1,7 @@
 import math
+import sys
 import tempfile
+from types import SimpleNamespace
 from pathlib import Path
 
 import pytest
@@ -8,7 +10,16 @@ from browsergym.experiments.loop import EnvArgs, ExpArgs
 from agentlab.agents.generic_agent.agent_configs import FLAGS_GPT_3_5, AGENT_4o_MINI
 from agentlab.agents.generic_agent.generic_agent import GenericAgentArgs
 from agentlab.analyze import inspect_results
-from agentlab.experiments.launch_exp import find_incomplete, run_experiments, non_dummy_count
+from agentlab.experiments.launch_exp import (
+    _iter_exp_dirs,
+    _prepare_exp_dirs,
+    _redirect_exp_dirs,
+    _resolve_n_jobs,
+    find_incomplete,
+    import_object,
+    non_dummy_count,
+    run_experiments,
+)
 from agentlab.experiments.study import Study
 from agentlab.llm.chat_api import CheatMiniWoBLLMArgs
 
@@ -25,6 +36,75 @@ def test_relaunch_study():
     assert non_dummy_count(exp_args_list) == 2
 
 
+def test_iter_exp_dirs():
+    study_dir = Path(__file__).parent.parent / "data" / "test_study"
+    exp_dirs = [path.parent for path in study_dir.glob("**/exp_args.pkl")]
+    assert sorted(_iter_exp_dirs(study_dir)) == sorted(exp_dirs)
+
+
+def test_prepare_exp_dirs_duplicates():
+    exp_args_list = []
+    for agent_name in ["org/model", "org_model"] * 4:
+        agent_args = GenericAgentArgs(chat_model_args=CheatMiniWoBLLMArgs(), flags=FLAGS_GPT_3_5)
+        agent_args.agent_name = agent_name  # both sanitize to the same exp_dir name
+        exp_args_list.append(
+            ExpArgs(
+                agent_args=agent_args,
+                env_args=EnvArgs(task_name="miniwob.click-test", task_seed=0, max_steps=5),
+            )
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _prepare_exp_dirs(exp_args_list, Path(tmp_dir), n_workers=8)
+        exp_dirs = {exp_args.exp_dir for exp_args in exp_args_list}
+        assert len(exp_dirs) == len(exp_args_list)
+        assert all((exp_dir / "exp_args.pkl").exists() for exp_dir in exp_dirs)
+
+
+def test_import_object():
+    agent_args = import_object("agentlab.agents.generic_agent.AGENT_4o_MINI")
+    assert agent_args is AGENT_4o_MINI
+    assert import_object("agentlab/agents/generic_agent/AGENT_4o_MINI") is AGENT_4o_MINI
+
+    with pytest.raises(ImportError):
+        import_object("agentlab.agents.generic_agent.NOT_AN_AGENT")
+
+
+def test_import_object_is_cached():
+    import_object.cache_clear()
+    path = "agentlab.agents.generic_agent.AGENT_4o_MINI"
+    assert import_object(path) is import_object(path)
+    cache_info = import_object.cache_info()
+    assert cache_info.misses == 1
+    assert cache_info.hits == 1
+
+
+def test_resolve_n_jobs(monkeypatch):
+    gb = 2**30
+    fake_psutil = SimpleNamespace(virtual_memory=lambda: SimpleNamespace(available=10 * gb))
+    monkeypatch.setitem(sys.modules, "psutil", fake_psutil)
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+
+    assert _resolve_n_jobs(None) == 7
+    assert _resolve_n_jobs(-1) == 7
+    assert _resolve_n_jobs(4) == 4
+    assert _resolve_n_jobs(4, memory_per_job_gb=2) == 4
+    assert _resolve_n_jobs(-1, memory_per_job_gb=4) == 2
+    assert _resolve_n_jobs(4, memory_per_job_gb=100) == 1
+
+    for memory_per_job_gb in [0, -1]:
+        with pytest.raises(ValueError):
+            _resolve_n_jobs(4, memory_per_job_gb=memory_per_job_gb)
+
+
+def test_unknown_backend_fails_before_prepare():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        study_dir = Path(tmp_dir) / "study"
+        with pytest.raises(ValueError):
+            run_experiments(1, [object()], study_dir, parallel_backend="not_a_backend")
+        assert not study_dir.exists()
+
+
 def _test_launch_system(backend="ray", cause_timeout=False):
 
     if cause_timeout:
@@ -95,6 +175,72 @@ def test_timeout_ray():
     _test_launch_system(backend="ray", cause_timeout=True)
 
 
+def test_local_scratch():
+    exp_args_list = [
+        ExpArgs(
+            agent_args=GenericAgentArgs(chat_model_args=CheatMiniWoBLLMArgs(), flags=FLAGS_GPT_3_5),
+            env_args=EnvArgs(task_name="miniwob.click-test", task_seed=seed, max_steps=5),
+        )
+        for seed in range(2)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        study_dir = Path(tmp_dir) / "study"
+        scratch_dir = Path(tmp_dir) / "scratch"
+
+        run_experiments(
+            1, exp_args_list, study_dir, parallel_backend="sequential", local_scratch=scratch_dir
+        )
+        for exp_args in exp_args_list:
+            assert exp_args.exp_dir.parent == study_dir
+            assert (exp_args.exp_dir / "summary_info.json").exists()
+        assert not (scratch_dir / study_dir.name).exists()
+
+        # make one experiment incomplete and relaunch it through the scratch dir
+        old_exp_dir = exp_args_list[0].exp_dir
+        (old_exp_dir / "summary_info.json").unlink()
+        relaunch_list = find_incomplete(study_dir, include_errors=True)
+        assert non_dummy_count(relaunch_list) == 1
+
+        run_experiments(
+            1, relaunch_list, study_dir, parallel_backend="sequential", local_scratch=scratch_dir
+        )
+        assert (study_dir / f"_{old_exp_dir.name}").exists()
+        for exp_args in relaunch_list:
+            assert exp_args.exp_dir.parent == study_dir
+            assert (exp_args.exp_dir / "summary_info.json").exists()
+        assert not (scratch_dir / study_dir.name).exists()
+
+        results_df = inspect_results.load_result_df(study_dir, progress_fn=None)
+        assert len(results_df) == len(exp_args_list)
+
+
+def test_local_scratch_interrupted():
+    exp_args_list = [
+        ExpArgs(
+            agent_args=GenericAgentArgs(chat_model_args=CheatMiniWoBLLMArgs(), flags=FLAGS_GPT_3_5),
+            env_args=EnvArgs(task_name="miniwob.click-test", task_seed=seed, max_steps=5),
+        )
+        for seed in range(2)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        study_dir = Path(tmp_dir) / "study"
+        scratch_root = Path(tmp_dir) / "scratch" / study_dir.name
+
+        # what run_experiments does before running, then the process is killed
+        _prepare_exp_dirs(exp_args_list, study_dir, n_workers=2)
+        _redirect_exp_dirs(exp_args_list, study_dir, scratch_root)
+        for exp_args in exp_args_list:
+            assert exp_args.exp_dir.parent == scratch_root
+            (exp_args.exp_dir / "experiment.log").write_text("killed")
+
+        relaunch_list = find_incomplete(study_dir, include_errors=True)
+        assert non_dummy_count(relaunch_list) == len(exp_args_list)
+        for exp_args in relaunch_list:
+            assert exp_args.exp_dir.parent == study_dir
+
+
 @pytest.mark.pricy
 def test_4o_mini_on_miniwob_tiny_test():
     """Run with `pytest -m pricy`."""
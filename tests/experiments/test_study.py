@@ -62,6 +62,20 @@ def test_launch_parallel_study():
         assert n_completed == "4/4"
 
 
+def test_shuffle_exps_seed():
+    def shuffled_order(seed):
+        study = make_study(_make_agent_args_list(), benchmark="miniwob_tiny_test")
+        study.shuffle_exps(seed=seed)
+        return [
+            (exp_args.agent_args.agent_name, exp_args.env_args.task_name, exp_args.env_args.task_seed)
+            for exp_args in study.exp_args_list
+        ]
+
+    order = shuffled_order(seed=42)
+    assert shuffled_order(seed=42) == order
+    assert sorted(shuffled_order(seed=None)) == sorted(order)
+
+
 if __name__ == "__main__":
     # test_launch_parallel_study()
     manual_test_launch_parallel_study_webarena()